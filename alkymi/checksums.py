@@ -1,19 +1,25 @@
+import errno
+import stat
+import struct
+import time
+import types
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Sequence, Dict, Callable
+from typing import Any, Sequence, Dict, Callable, Tuple
 import pickle
 import alkymi.config
 
-# Try to use xxh3 from xxhash to speed up hashing significantly, otherwise fallback to built-in MD5
+# Try to use xxh3 from xxhash to speed up hashing significantly, otherwise fallback to built-in BLAKE2b (which is faster
+# than MD5 on 64-bit platforms) with a 128-bit digest
 try:
     import xxhash
 
     HASHER = xxhash.xxh3_64
 except ImportError:
     import hashlib
+    from functools import partial
 
-    HASHER = hashlib.md5
-
-import inspect
+    HASHER = partial(hashlib.blake2b, digest_size=16)
 
 # Load additional checksum generators based on available libs
 from alkymi import AlkymiConfig
@@ -30,7 +36,8 @@ try:
         :param array: The numpy array to compute a checksum for
         :return: The computed checksum as a string
         """
-        return HASHER(array.data).hexdigest()
+        # Hashing requires a contiguous buffer - this is a no-op for arrays that are already C-contiguous
+        return HASHER(np.ascontiguousarray(array).data).hexdigest()
 
 
     additional_checksum_generators[np.ndarray] = _handle_ndarray
@@ -56,9 +63,39 @@ except ImportError:
     pass
 
 
+# Types of functions and methods, which are checksummed using their bytecode, default arguments, constants and closures
+_ROUTINE_TYPES = (types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+
+# Tags used to mark sequences of primitives that are checksummed in one go - these can't collide with the type tags used
+# when checksumming each element separately, since those never start with a null byte
+_PRIMITIVE_SEQUENCE_TAGS: Dict[type, bytes] = {int: b"\x00int64", float: b"\x00float64", str: b"\x00str"}
+
+# Errors that cause a path to be treated as non-existent - these match the errors ignored by Path.exists()
+_MISSING_PATH_ERRNOS = frozenset((errno.ENOENT, errno.ENOTDIR, errno.EBADF, errno.ELOOP))
+_MISSING_PATH_WINERRORS = frozenset((21, 123, 1921))  # Drive not ready, invalid name, cannot access symlink
+
+
+def _is_missing_path_error(e: OSError) -> bool:
+    """
+    Checks whether an error raised when accessing a path means that the path should be treated as non-existent
+
+    :param e: The error raised when accessing the path
+    :return: True if the path should be treated as non-existent
+    """
+    return e.errno in _MISSING_PATH_ERRNOS or getattr(e, "winerror", None) in _MISSING_PATH_WINERRORS
+
+
+# Size of the chunks that files are read in when hashing their contents - large enough to amortize the per-call overhead
+# of reading and hashing in Python
+_FILE_READ_CHUNK_SIZE = 1024 * 1024
+
+# Minimum size of the buffer that files are read into, regardless of the size reported for the file
+_FILE_READ_MIN_BUFFER_SIZE = 64 * 1024
+
+
 class Checksummer(object):
     """
-    Class used to compute a stable hash/checksum of an object recursively. Currently uses MD5.
+    Class used to compute a stable hash/checksum of an object recursively. Uses xxh3 if available, otherwise BLAKE2b.
     """
 
     def __init__(self):
@@ -76,27 +113,33 @@ class Checksummer(object):
 
         # The type of the input object needs to be taken into consideration to avoid different types with the same value
         # resulting in the same checksum
-        self._hasher.update(str(type(obj)).encode("utf-8"))
-
-        if isinstance(obj, str):
-            self._hasher.update(obj.encode("utf-8"))
+        obj_type = type(obj)
+        type_tag = _TYPE_TAGS.get(obj_type)
+        if type_tag is None:
+            type_tag = _TYPE_TAGS[obj_type] = str(obj_type).encode("utf-8")
+        self._hasher.update(type_tag)
+
+        # Common types are dispatched directly on their exact type to avoid going through the isinstance checks below
+        handler = _UPDATE_HANDLERS.get(obj_type)
+        if handler is not None:
+            handler(self, obj)
+        elif isinstance(obj, str):
+            self._update_str(obj)
         elif isinstance(obj, bytes):
-            self._hasher.update(obj)
-        elif isinstance(obj, (int, float)):
-            self.update(str(obj))
+            self._update_bytes(obj)
+        elif isinstance(obj, int):
+            self._update_int(obj)
+        elif isinstance(obj, float):
+            self._update_float(obj)
         elif isinstance(obj, Sequence):
-            for e in obj:
-                self.update(e)
+            self._update_sequence(obj)
         elif isinstance(obj, Dict):
-            keys = obj.keys()
-            for k in keys:
-                self.update(k)
-                self.update(obj[k])
+            self._update_dict(obj)
         elif isinstance(obj, Path):
             self._update_path(obj)
-        elif inspect.iscode(obj):
-            self.update(obj.co_code)
-        elif inspect.isroutine(obj):
+        elif isinstance(obj, types.CodeType):
+            self._update_code(obj)
+        elif isinstance(obj, _ROUTINE_TYPES):
             self._update_func(obj)
         else:
             # Check if any additional checksum generator will work
@@ -114,6 +157,99 @@ class Checksummer(object):
                 except pickle.PicklingError:
                     raise ValueError("Checksum not supported for type: {}".format(type(obj)))
 
+    def _update_str(self, s: str) -> None:
+        """
+        Update the current checksum with a string
+
+        :param s: The string to update the checksum with
+        """
+        self._hasher.update(s.encode("utf-8"))
+
+    def _update_bytes(self, b: bytes) -> None:
+        """
+        Update the current checksum with bytes
+
+        :param b: The bytes to update the checksum with
+        """
+        self._hasher.update(b)
+
+    def _update_int(self, i: int) -> None:
+        """
+        Update the current checksum with an integer
+
+        :param i: The integer to update the checksum with
+        """
+        # Hash the minimal two's complement representation directly instead of going through a string
+        self._hasher.update(i.to_bytes((i.bit_length() + 8) // 8, "little", signed=True))
+
+    def _update_float(self, f: float) -> None:
+        """
+        Update the current checksum with a float
+
+        :param f: The float to update the checksum with
+        """
+        self._hasher.update(struct.pack("<d", f))
+
+    def _update_sequence(self, seq: Sequence) -> None:
+        """
+        Update the current checksum with a sequence (e.g. a list or tuple)
+
+        :param seq: The sequence to update the checksum with
+        """
+        if not self._update_primitive_sequence(seq):
+            for e in seq:
+                self.update(e)
+
+    def _update_dict(self, d: Dict) -> None:
+        """
+        Update the current checksum with a dictionary
+
+        :param d: The dictionary to update the checksum with
+        """
+        for k, v in d.items():
+            self.update(k)
+            self.update(v)
+
+    def _update_primitive_sequence(self, seq: Sequence) -> bool:
+        """
+        Update the current checksum with a sequence of primitives of a single type (ints, floats or strings) in one go,
+        avoiding the overhead of checksumming each element separately
+
+        :param seq: The sequence to update the checksum with
+        :return: True if the sequence was handled, False if it must be checksummed element by element
+        """
+        if len(seq) == 0:
+            return False
+        element_type = type(seq[0])
+        tag = _PRIMITIVE_SEQUENCE_TAGS.get(element_type)
+        if tag is None or any(type(e) is not element_type for e in seq):
+            return False
+
+        if element_type is int:
+            try:
+                data = struct.pack(f"<{len(seq)}q", *seq)
+            except struct.error:
+                # At least one integer is outside the 64-bit range
+                return False
+        elif element_type is float:
+            data = struct.pack(f"<{len(seq)}d", *seq)
+        else:
+            # Prefix each string with its length, such that e.g. ["ab"] and ["a", "b"] can't collide
+            encoded = [e.encode("utf-8") for e in seq]
+            data = b"".join(len(e).to_bytes(8, "little") + e for e in encoded)
+
+        self._hasher.update(tag)
+        self._hasher.update(data)
+        return True
+
+    def _update_code(self, code: types.CodeType) -> None:
+        """
+        Update the current checksum with a code object
+
+        :param code: The code object to update the checksum with
+        """
+        self.update(code.co_code)
+
     def _update_func(self, fn) -> None:
         """
         Update the current checksum with a function
@@ -122,8 +258,8 @@ class Checksummer(object):
         """
         code = fn.__code__
 
-        # Hash the bytecode
-        self.update(code.co_code)
+        # Hash the bytecode and referenced constants - these can't change, so their digest is only computed once
+        self._hasher.update(_code_digest(code))
 
         # Hash default arguments
         defaults = fn.__defaults__
@@ -131,12 +267,6 @@ class Checksummer(object):
             default_values = dict(zip(code.co_varnames[-len(defaults):], defaults))
             self.update(default_values)
 
-        # Hash constants that are referenced by the bytecode but ignore names of lambdas
-        if code.co_consts:
-            for const in code.co_consts:
-                if not isinstance(const, str) or not const.endswith(".<lambda>"):
-                    self.update(const)
-
         # Handle referenced functions
         if code.co_freevars:
             assert len(code.co_freevars) == len(fn.__closure__)
@@ -150,34 +280,48 @@ class Checksummer(object):
 
         :param path: The Path to update the checksum with
         """
+        # The path itself is always part of the checksum, so only convert it to a string once
+        path_str = str(path)
+
+        # Stat the path once, and use the result for all the checks below
+        try:
+            path_stat = path.stat()
+        except OSError as e:
+            if not _is_missing_path_error(e):
+                raise
+            path_stat = None
+
         # For non-existent paths, we just care about the path itself
-        if not path.exists():
-            self.update(str(path))
+        if path_stat is None:
+            self.update(path_str)
             return
 
         # For directories, we care about the path and whether it exists
-        if path.is_dir():
-            self.update(str(path))
-            self.update(path.exists())
+        if stat.S_ISDIR(path_stat.st_mode):
+            self.update(path_str)
+            self.update(True)
             return
 
         # For files, we care about file name ...
-        self.update(str(path))
+        self.update(path_str)
 
         # ... and either the file hash
         file_checksum_method = alkymi.config.AlkymiConfig.get().file_checksum_method
         if file_checksum_method == alkymi.config.FileChecksumMethod.HashContents:
             with path.open('rb') as f:
-                size = 1024 * self._hasher.block_size
-                b = f.read(size)
-                while len(b) > 0:
-                    self._hasher.update(b)
-                    b = f.read(size)
+                # Read into a single reused buffer to avoid allocating a new bytes object for every chunk - small files
+                # only need a buffer slightly larger than the file itself, but the reported size isn't always accurate
+                # (e.g. procfs/sysfs entries report a size of zero), so a minimum buffer size is used
+                buffer = bytearray(min(_FILE_READ_CHUNK_SIZE, max(path_stat.st_size + 1, _FILE_READ_MIN_BUFFER_SIZE)))
+                view = memoryview(buffer)
+                n = f.readinto(buffer)
+                while n:
+                    self._hasher.update(view[:n])
+                    n = f.readinto(buffer)
 
         # ... or the file modification timestamp
         elif file_checksum_method == alkymi.config.FileChecksumMethod.ModificationTimestamp:
-            last_modification_timestamp = path.stat().st_mtime_ns
-            self.update(last_modification_timestamp)
+            self.update(path_stat.st_mtime_ns)
 
     def digest(self) -> str:
         """
@@ -186,6 +330,86 @@ class Checksummer(object):
         return self._hasher.hexdigest()
 
 
+@lru_cache(maxsize=1024)
+def _code_digest(code: types.CodeType) -> bytes:
+    """
+    Computes a digest of the bytecode of a code object and the constants referenced by it (ignoring names of lambdas).
+    Code objects are immutable, so the result is cached
+
+    :param code: The code object to compute a digest for
+    :return: The digest as bytes
+    """
+    hasher = Checksummer()
+    hasher.update(code.co_code)
+    for const in code.co_consts:
+        if not isinstance(const, str) or not const.endswith(".<lambda>"):
+            hasher.update(const)
+    return hasher.digest().encode("utf-8")
+
+
+# Encoded type names of the types seen so far, to avoid converting the type to a string for every checksummed item
+_TYPE_TAGS: Dict[type, bytes] = {}
+
+# Handlers for the most common types, keyed by their exact type
+_UPDATE_HANDLERS: Dict[type, Callable[[Checksummer, Any], None]] = {
+    str: Checksummer._update_str,
+    bytes: Checksummer._update_bytes,
+    int: Checksummer._update_int,
+    bool: Checksummer._update_int,
+    float: Checksummer._update_float,
+    list: Checksummer._update_sequence,
+    tuple: Checksummer._update_sequence,
+    dict: Checksummer._update_dict,
+    type(Path()): Checksummer._update_path,
+    types.CodeType: Checksummer._update_code,
+    types.FunctionType: Checksummer._update_func,
+}
+
+# Checksums of files (when hashing file contents) keyed by path. Each entry also stores the file metadata at the time of
+# hashing, which allows the contents of unmodified files to be skipped when their checksum is requested again
+_file_checksum_cache: Dict[str, Tuple[Tuple[int, int, int, int, int], str]] = {}
+
+# Files modified (or with metadata changed) less than this long before being hashed are not cached, since a subsequent
+# modification may not change the timestamps on file systems with coarse timestamp granularity
+_FILE_CHECKSUM_CACHE_MIN_AGE_NS = 2 * 10 ** 9
+
+
+def _file_checksum(path: Path) -> str:
+    """
+    Computes the checksum of a Path by hashing the contents of the file it points to. The result is cached, and reused
+    for as long as the modification and status change timestamps, size, inode and device of the file remain the same
+
+    :param path: The Path to compute a checksum for
+    :return: The checksum as a string
+    """
+    try:
+        file_stat = path.stat()
+    except OSError:
+        file_stat = None
+
+    # Only regular files are cached, other paths (directories, non-existent files) are cheap to checksum
+    if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
+        hasher = Checksummer()
+        hasher.update(path)
+        return hasher.digest()
+
+    key = str(path)
+    # The status change timestamp is included since it can't be set by the user (e.g. when a tool rewrites a file and
+    # restores its previous modification timestamp), and inodes are only unique per device
+    signature = (file_stat.st_mtime_ns, file_stat.st_ctime_ns, file_stat.st_size, file_stat.st_ino, file_stat.st_dev)
+    cached = _file_checksum_cache.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    hashed_at = time.time_ns()
+    hasher = Checksummer()
+    hasher.update(path)
+    digest = hasher.digest()
+    if hashed_at - max(file_stat.st_mtime_ns, file_stat.st_ctime_ns) > _FILE_CHECKSUM_CACHE_MIN_AGE_NS:
+        _file_checksum_cache[key] = (signature, digest)
+    return digest
+
+
 def function_hash(fn: Callable) -> str:
     """
     Computes the hash/checksum of a function
@@ -209,6 +433,11 @@ def checksum(obj: Any) -> str:
     if obj is None:
         return "None"
 
+    # File contents are expensive to hash, so reuse the checksum of files that haven't been modified
+    if isinstance(obj, Path) and \
+            AlkymiConfig.get().file_checksum_method == alkymi.config.FileChecksumMethod.HashContents:
+        return _file_checksum(obj)
+
     hasher = Checksummer()
     hasher.update(obj)
     return hasher.digest()
@@ -2,17 +2,17 @@ import asyncio
 import concurrent.futures
 import typing
 from asyncio import Future, AbstractEventLoop, Task
+from itertools import repeat
 from typing import Dict, Tuple, Optional, Any, Coroutine, Union
 
 import networkx as nx
 
 from . import checksums, utils
 from .config import ProgressType, AlkymiConfig
-from .foreach_recipe import ForeachRecipe, MappedOutputs, MappedInputs
+from .foreach_recipe import ForeachRecipe, MappedOutputs, MappedInputs, MappedInputsChecksums
 from .logging import log
-from .progress import FancyProgress
 from .recipe import Recipe, R
-from .serialization import OutputWithValue
+from .serialization import Output, OutputWithValue
 from .types import Status, ProgressCallback, EvaluateProgress
 
 OutputsAndChecksums = Tuple[R, Optional[str]]
@@ -26,7 +26,7 @@ def create_graph(recipe: Recipe[R]) -> nx.DiGraph:
     :param recipe: The recipe to construct a graph for
     :return: The constructed graph
     """
-    log.debug(f'Building graph for {recipe.name}')
+    log.debug('Building graph for %s', recipe.name)
     graph = nx.DiGraph()
     _add_recipe_to_graph(recipe, graph)
     return graph
@@ -41,7 +41,7 @@ def _add_recipe_to_graph(recipe: Recipe, graph: nx.DiGraph) -> None:
     :param graph: The graph to which the new node and edges should be added
     """
     graph.add_node(recipe)
-    log.debug(f'Added {recipe.name} to graph')
+    log.debug('Added %s to graph', recipe.name)
 
     # For each ingredient, add an edge from the ingredient to this recipe
     for _ingredient in recipe.ingredients:
@@ -51,46 +51,31 @@ def _add_recipe_to_graph(recipe: Recipe, graph: nx.DiGraph) -> None:
 
 def _compute_status(recipe: Recipe, graph: nx.DiGraph, statuses: Dict[Recipe, Status]) -> Status:
     """
-    Compute the status for the provided recipe (and recursively for dependencies) and add them all to the provided
-    'statuses' dict
+    Compute the status for the provided recipe - the statuses of all dependencies must already be present in the
+    provided 'statuses' dict
 
     :param recipe: The recipe to compute the status for
     :param graph: The graph to use for establishing statuses
-    :param statuses: A dictionary used to collect the results of the recursive call
+    :param statuses: A dictionary containing the already computed statuses of the dependencies of the recipe
     :return status: The status of this recipe
     """
-
-    def _store_and_return(_status: Status) -> Status:
-        """
-        Helper function to store a result in the 'statuses' dict before returning it
-        """
-        statuses[recipe] = _status
-        return _status
-
-    # Determine statuses of dependencies - note that this recursively computes statuses for dependencies and adds them
-    # to 'statuses', so this needs to be called before any return
     dependencies = tuple(graph.predecessors(recipe))
-    ingredient_statuses = tuple(
-        _compute_status(ingredient, graph, statuses)
-        for ingredient in dependencies
-    )
 
     # If output checksum is None (or transient), a full re-evaluation is needed
     if recipe.transient or recipe.output_checksum is None:
-        return _store_and_return(Status.NotEvaluatedYet)
+        return Status.NotEvaluatedYet
 
     # Check if one or more ingredients (dependencies) are dirty
-    if any(status != Status.Ok for status in ingredient_statuses):
-        return _store_and_return(Status.IngredientDirty)
+    if any(statuses[ingredient] != Status.Ok for ingredient in dependencies):
+        return Status.IngredientDirty
 
-    # Check if one or more ingredients (dependencies) are dirty
+    # Gather the output checksums of the ingredients - each 'output_checksum' property is only read once
     ingredient_output_checksums: Tuple[Optional[str], ...] = tuple(
-        ingredient.output_checksum
-        for ingredient in dependencies
-        if ingredient.output_checksum is not None
+        checksum
+        for checksum in (ingredient.output_checksum for ingredient in dependencies)
+        if checksum is not None
     )
-    status = is_clean(recipe, ingredient_output_checksums)
-    return _store_and_return(status)
+    return is_clean(recipe, ingredient_output_checksums)
 
 
 def compute_recipe_status(recipe: Recipe[R], graph: nx.DiGraph) -> Dict[Recipe, Status]:
@@ -101,9 +86,21 @@ def compute_recipe_status(recipe: Recipe[R], graph: nx.DiGraph) -> Dict[Recipe,
     :param graph: The graph representing the recipe and all its dependencies
     :return: The status of the provided recipe and all dependencies as a dictionary
     """
-    # Start recursion with an empty status dict
+    return compute_graph_status(graph)
+
+
+def compute_graph_status(graph: nx.DiGraph) -> Dict[Recipe, Status]:
+    """
+    Compute the Status for all recipes contained in the provided graph
+
+    :param graph: The graph representing one or more recipes and all their dependencies
+    :return: The status of every recipe in the graph as a dictionary, in topological order
+    """
+    # Walk the graph in topological order, such that the statuses of all dependencies of a recipe have been computed
+    # before the recipe itself is reached - this visits each recipe exactly once without any recursion
     statuses: Dict[Recipe, Status] = {}
-    _compute_status(recipe, graph, statuses)
+    for _recipe in nx.topological_sort(graph):
+        statuses[_recipe] = _compute_status(_recipe, graph, statuses)
     return statuses
 
 
@@ -121,7 +118,7 @@ async def invoke(recipe: Recipe, inputs: Tuple[Any, ...], input_checksums: Tuple
     :param progress_callback: An optional callback to invoke when evaluation progress occurs
     :return: The output(s) and checksum(s) of the evaluated recipe
     """
-    log.debug('Invoking recipe: {}'.format(recipe.name))
+    log.debug('Invoking recipe: %s', recipe.name)
 
     # Signal that work has started on 1 out of 1 unit of work
     if progress_callback is not None:
@@ -159,7 +156,7 @@ async def invoke_foreach(recipe: ForeachRecipe, inputs: Tuple[Any, ...],
     :param progress_callback: An optional callback to invoke when evaluation progress occurs
     :return: The output(s) and checksum(s) of the evaluated recipe
     """
-    log.debug("Invoking recipe: {}".format(recipe.name))
+    log.debug("Invoking recipe: %s", recipe.name)
 
     # The first ingredient will provide the sequence to apply the bound function too
     mapped_inputs = inputs[0]
@@ -194,95 +191,126 @@ async def invoke_foreach(recipe: ForeachRecipe, inputs: Tuple[Any, ...],
 
     # Catch up on already done work
     # TODO(mathias): Refactor this insanity to avoid the list/dict type checking
+    # The checksums of evaluated inputs are collected along the way, such that these don't have to be recomputed every
+    # time the current result is stored in the recipe. Checksums already computed for inputs that still need to be
+    # evaluated are kept as well (in the same order as the inputs, None if not computed), so that each input is only
+    # checksummed once
     outputs: MappedOutputs = [] if isinstance(mapped_inputs, list) else {}
     evaluated: MappedInputs = [] if isinstance(mapped_inputs, list) else {}
+    evaluated_checksums: MappedInputsChecksums = [] if isinstance(mapped_inputs, list) else {}
     not_evaluated: MappedInputs = [] if isinstance(mapped_inputs, list) else {}
+    not_evaluated_checksums: typing.List[Optional[str]] = []
     if needs_full_eval or recipe.mapped_outputs is None:
         not_evaluated = mapped_inputs
+        not_evaluated_checksums = [None] * len(mapped_inputs)
     else:
-        if isinstance(mapped_inputs, list) and isinstance(outputs, list) \
-                and isinstance(evaluated, list) and isinstance(not_evaluated, list):
+        if isinstance(mapped_inputs, list) and isinstance(outputs, list) and isinstance(evaluated, list) \
+                and isinstance(evaluated_checksums, list) and isinstance(not_evaluated, list):
+            # Map each previously seen checksum to the index of its first occurrence to avoid a linear search per item
+            previous_indices: Dict[Optional[str], int] = {}
+            for idx, previous_checksum in enumerate(recipe.mapped_inputs_checksums):  # type: ignore
+                previous_indices.setdefault(previous_checksum, idx)
             for item in mapped_inputs:
                 # Try to look up cached result for this input
-                try:
-                    new_checksum = checksums.checksum(item)
-                    idx = recipe.mapped_inputs_checksums.index(new_checksum)  # type: ignore
-                    found_checksum = recipe.mapped_inputs_checksums[idx]  # type: ignore
-                    if new_checksum == found_checksum:
-                        found_output = recipe.mapped_outputs[idx]
-                        if found_output.valid:
-                            outputs.append(found_output)
-                            evaluated.append(item)
-                            continue
-                except ValueError:
-                    pass
+                new_checksum = checksums.checksum(item)
+                found_idx = previous_indices.get(new_checksum)
+                if found_idx is not None:
+                    found_output = recipe.mapped_outputs[found_idx]
+                    if found_output.valid:
+                        outputs.append(found_output)
+                        evaluated.append(item)
+                        evaluated_checksums.append(new_checksum)
+                        continue
                 not_evaluated.append(item)
-        elif isinstance(mapped_inputs, dict):
+                not_evaluated_checksums.append(new_checksum)
+        elif isinstance(mapped_inputs, dict) and isinstance(evaluated_checksums, dict):
             for key, item in mapped_inputs.items():
                 # Try to look up cached result for this input
+                new_dict_checksum: Optional[str] = None
                 found_checksum = recipe.mapped_inputs_checksums.get(key, None)  # type: ignore
                 if found_checksum is not None:
-                    new_checksum = checksums.checksum(key)
-                    if new_checksum == found_checksum:
+                    new_dict_checksum = checksums.checksum(item)
+                    if new_dict_checksum == found_checksum:
                         found_output = recipe.mapped_outputs[key]
                         if found_output.valid:
                             outputs[key] = found_output
                             evaluated[key] = item
+                            evaluated_checksums[key] = new_dict_checksum
                             continue
                 not_evaluated[key] = item
+                not_evaluated_checksums.append(new_dict_checksum)
 
     # Signal that work has started on X out of Y units of work
+    num_mapped_inputs = len(mapped_inputs)
     if progress_callback is not None:
-        progress_callback(EvaluateProgress.Started, recipe, len(mapped_inputs), len(evaluated))
+        progress_callback(EvaluateProgress.Started, recipe, num_mapped_inputs, len(evaluated))
 
-    log.debug("Num already cached results: {}/{}".format(len(evaluated), len(mapped_inputs)))
-    if len(evaluated) == len(mapped_inputs):
+    log.debug("Num already cached results: %d/%d", len(evaluated), num_mapped_inputs)
+    if len(evaluated) == num_mapped_inputs:
         log.debug("Returning early since all items were already cached")
-        recipe.set_current_result(evaluated, outputs, mapped_inputs_checksum, other_input_checksums, True)
+        recipe.set_current_result(evaluated, outputs, mapped_inputs_checksum, other_input_checksums, True,
+                                  evaluated_checksums)
         return recipe.outputs, recipe.output_checksum
 
     # Perform remaining work - store state every time an evaluation is successful
+    # Lists and dicts are handled uniformly by pairing every item with its key (None for lists)
+    keys: typing.Iterable[Any] = not_evaluated.keys() if isinstance(not_evaluated, dict) else repeat(None)
+    items = list(not_evaluated.values()) if isinstance(not_evaluated, dict) else not_evaluated
     results: typing.Iterable[Any]
-    if isinstance(not_evaluated, list) and isinstance(outputs, list) and isinstance(evaluated, list):
-        if executor is not None:
-            results = [loop.run_in_executor(executor, recipe.__call__, _item, *other_inputs) for _item in
-                       not_evaluated]
-        else:
-            results = map(lambda _item: recipe(_item, *other_inputs), not_evaluated)
-        for item, maybe_async_result in zip(not_evaluated, results):
-            result = await maybe_async_result if isinstance(maybe_async_result, Future) else maybe_async_result
-            outputs.append(OutputWithValue(result, checksums.checksum(result)))
-            evaluated.append(item)
-            recipe.set_current_result(evaluated, outputs, mapped_inputs_checksum, other_input_checksums, False)
-
-            # Signal that work has completed on X out of Y units of work
-            if progress_callback is not None:
-                progress_callback(EvaluateProgress.InProgress, recipe, len(mapped_inputs), len(evaluated))
-    elif isinstance(not_evaluated, dict):
-        if executor is not None:
-            results = [loop.run_in_executor(executor, recipe.__call__, _item, *other_inputs) for _item in
-                       not_evaluated.values()]
-        else:
-            results = map(lambda _item: recipe(_item, *other_inputs), not_evaluated.values())
-        for (key, item), maybe_async_result in zip(not_evaluated.items(), results):
-            result = await maybe_async_result if isinstance(maybe_async_result, Future) else maybe_async_result
-            outputs[key] = OutputWithValue(result, checksums.checksum(result))
-            evaluated[key] = item
-            recipe.set_current_result(evaluated, outputs, mapped_inputs_checksum, other_input_checksums, False)
-
-            # Signal that work has completed on X out of Y units of work
-            if progress_callback is not None:
-                progress_callback(EvaluateProgress.InProgress, recipe, len(mapped_inputs), len(evaluated))
-
-    recipe.set_current_result(evaluated, outputs, mapped_inputs_checksum, other_input_checksums, True)
+    if executor is not None:
+        results = [loop.run_in_executor(executor, recipe.__call__, _item, *other_inputs) for _item in items]
+    elif other_inputs:
+        results = map(lambda _item: recipe(_item, *other_inputs), items)
+    else:
+        results = map(recipe, items)
+    for key, item, item_checksum, maybe_async_result in zip(keys, items, not_evaluated_checksums, results):
+        result = await maybe_async_result if isinstance(maybe_async_result, Future) else maybe_async_result
+        if item_checksum is None:
+            item_checksum = checksums.checksum(item)
+        _add_mapped_result(outputs, evaluated, evaluated_checksums, key, item, item_checksum,
+                           OutputWithValue(result, checksums.checksum(result)))
+        recipe.set_current_result(evaluated, outputs, mapped_inputs_checksum, other_input_checksums, False,
+                                  evaluated_checksums)
+
+        # Signal that work has completed on X out of Y units of work
+        if progress_callback is not None:
+            progress_callback(EvaluateProgress.InProgress, recipe, num_mapped_inputs, len(evaluated))
+
+    recipe.set_current_result(evaluated, outputs, mapped_inputs_checksum, other_input_checksums, True,
+                              evaluated_checksums)
 
     # Signal that work has completed on N out of N units of work
     if progress_callback is not None:
-        progress_callback(EvaluateProgress.Done, recipe, len(mapped_inputs), len(evaluated))
+        progress_callback(EvaluateProgress.Done, recipe, num_mapped_inputs, len(evaluated))
 
     return recipe.outputs, recipe.output_checksum
 
 
+def _add_mapped_result(outputs: MappedOutputs, evaluated: MappedInputs, evaluated_checksums: MappedInputsChecksums,
+                       key: Any, item: Any, item_checksum: Optional[str], output: Output) -> None:
+    """
+    Add the output of evaluating a single mapped input to the collected outputs and evaluated inputs of a ForeachRecipe
+
+    :param outputs: The outputs collected so far (a list or dictionary)
+    :param evaluated: The mapped inputs evaluated so far (a list or dictionary)
+    :param evaluated_checksums: The checksums of the mapped inputs evaluated so far (a list or dictionary)
+    :param key: The key of the mapped input (only used when mapped inputs are a dictionary)
+    :param item: The mapped input that was evaluated
+    :param item_checksum: The checksum of the mapped input that was evaluated
+    :param output: The output resulting from evaluating the mapped input
+    """
+    if isinstance(outputs, list) and isinstance(evaluated, list) and isinstance(evaluated_checksums, list):
+        outputs.append(output)
+        evaluated.append(item)
+        evaluated_checksums.append(item_checksum)
+    elif isinstance(outputs, dict) and isinstance(evaluated, dict) and isinstance(evaluated_checksums, dict):
+        outputs[key] = output
+        evaluated[key] = item
+        evaluated_checksums[key] = item_checksum
+    else:
+        raise RuntimeError("Mismatched types of outputs and evaluated inputs")
+
+
 async def schedule(loop: AbstractEventLoop, executor: Optional[concurrent.futures.Executor], recipe: Recipe,
                    status: Status, coros_or_tasks: Dict[Recipe, Union[Coroutine, Task]],
                    progress_callback: Optional[ProgressCallback] = None) -> OutputsAndChecksums:
@@ -336,6 +364,11 @@ def evaluate_recipe(recipe: Recipe[R], graph: nx.DiGraph, statuses: Dict[Recipe,
     :param progress_type: The method to use for showing progress, if None will default to setting in alkymi's config
     :return: The output(s) and checksum(s) of the evaluated recipe
     """
+    # If the target recipe is already up-to-date, there's nothing to evaluate - skip setting up the executor, progress
+    # output and event loop, and just return the (possibly lazily loaded) cached outputs
+    if statuses[recipe] == Status.Ok:
+        return typing.cast(R, recipe.outputs), recipe.output_checksum
+
     # Create the executor to use for evaluating bound functions
     executor: Optional[concurrent.futures.Executor]
     if jobs == 1:
@@ -346,7 +379,11 @@ def evaluate_recipe(recipe: Recipe[R], graph: nx.DiGraph, statuses: Dict[Recipe,
     # Determine the progress type to use - if not provided by caller, use current setting in alkymi's global config
     if progress_type is None:
         progress_type = AlkymiConfig.get().progress_type
-    progress = FancyProgress(graph, statuses, recipe) if progress_type == ProgressType.Fancy else None
+    progress = None
+    if progress_type == ProgressType.Fancy:
+        # Lazy import to avoid importing rich's progress machinery unless progress is actually shown
+        from .progress import FancyProgress
+        progress = FancyProgress(graph, statuses, recipe)
 
     # Define function that can be called from current or new thread to setup and perform execution
     def _setup_and_execute() -> OutputsAndChecksums[R]:
@@ -360,7 +397,7 @@ def evaluate_recipe(recipe: Recipe[R], graph: nx.DiGraph, statuses: Dict[Recipe,
             def _exception_handler(_, context: Dict[str, Any]):
                 # context["message"] will always be there; but context["exception"] may not
                 msg = context.get("exception", context["message"])
-                log.debug(f"Exception during parallel execution: '{msg}'")
+                log.debug("Exception during parallel execution: '%s'", msg)
 
             loop.set_exception_handler(_exception_handler)
 
@@ -405,6 +442,11 @@ def evaluate_recipe(recipe: Recipe[R], graph: nx.DiGraph, statuses: Dict[Recipe,
         if progress is not None:
             progress.stop()
 
+        # Let the worker threads exit once idle instead of keeping them alive until interpreter shutdown - don't block,
+        # so that e.g. a CTRL-C isn't held up by work still running on other threads
+        if executor is not None:
+            executor.shutdown(wait=False)
+
     return output, checksum
 
 
@@ -427,7 +469,7 @@ def is_clean(recipe: Recipe[R], new_input_checksums: Tuple[Optional[str], ...])
 
     # Compute input checksums and perform equality check
     if recipe.input_checksums != new_input_checksums:
-        log.debug('{} -> dirty: input checksums changed'.format(recipe.name))
+        log.debug('%s -> dirty: input checksums changed', recipe.name)
         return Status.InputsChanged
 
     # Check if bound function has changed
@@ -443,7 +485,8 @@ def is_clean(recipe: Recipe[R], new_input_checksums: Tuple[Optional[str], ...])
     return Status.Ok
 
 
-def brew(recipe: Recipe[R], *, jobs: int, progress_type: Optional[ProgressType]) -> R:
+def brew(recipe: Recipe[R], *, jobs: int, progress_type: Optional[ProgressType],
+         graph: Optional[nx.DiGraph] = None) -> R:
     """
     Evaluate a Recipe and all dependent inputs - this will build the computational graph and execute any needed
     dependencies to produce the outputs of the input Recipe
@@ -452,9 +495,11 @@ def brew(recipe: Recipe[R], *, jobs: int, progress_type: Optional[ProgressType])
     :param jobs: The number of jobs to use for evaluating the recipe in parallel, 1 job corresponds to no parallelism,
                  zero or negative values will cause alkymi to use the system's default number of jobs
     :param progress_type: The method to use for showing progress, if None will default to setting in alkymi's config
+    :param graph: An optional, previously created graph for the Recipe - if None, the graph will be created
     :return: The outputs of the Recipe (which correspond to the outputs of the bound function)
     """
-    graph = create_graph(recipe)
+    if graph is None:
+        graph = create_graph(recipe)
     statuses = compute_recipe_status(recipe, graph)
     result, _ = evaluate_recipe(recipe, graph, statuses, jobs, progress_type)
     return result
@@ -1,11 +1,10 @@
-from collections import OrderedDict
 from typing import Iterable, Callable, Optional, Tuple, Any, List, Dict, Union, cast, TypeVar
 from itertools import chain
 
-from . import checksums, serialization
+from . import checksums
 from .logging import log
 from .recipe import Recipe, CacheType, CleanlinessFunc
-from .serialization import Output, OutputWithValue, CachedOutput
+from .serialization import Output, CachedOutput
 
 MappedInputs = Union[List[Any], Dict[Any, Any]]
 MappedOutputs = Union[List[Output], Dict[Any, Output]]
@@ -22,6 +21,8 @@ class ForeachRecipe(Recipe[R]):
     seen inputs, this means that changing the inputs to a ForeachRecipe may only trigger reevaluation of the bound
     function for some inputs, avoiding the overhead of recomputing things
     """
+    __slots__ = ("_mapped_inputs", "_mapped_inputs_type", "_mapped_inputs_checksums", "_mapped_inputs_checksum",
+                 "_mapped_outputs", "_mapped_outputs_checksum")
 
     def __init__(self, mapped_recipe: Recipe, ingredients: Iterable[Recipe], func: Callable[..., R], name: str,
                  transient: bool, doc: str, cache: CacheType, cleanliness_func: Optional[CleanlinessFunc] = None):
@@ -83,7 +84,6 @@ class ForeachRecipe(Recipe[R]):
         if mapped_inputs is None:
             return
 
-        # FIXME(mathias): This does unnecessary work by checksumming the same items multiple times during evaluation
         if isinstance(mapped_inputs, list):
             self._mapped_inputs_checksums = []
             for inp in mapped_inputs:
@@ -154,7 +154,8 @@ class ForeachRecipe(Recipe[R]):
             raise ValueError("Invalid type of mapped_outputs")
 
     def set_current_result(self, evaluated: MappedInputs, outputs: MappedOutputs, mapped_inputs_checksum: Optional[str],
-                           other_input_checksums: Tuple[Optional[str], ...], completed: bool) -> None:
+                           other_input_checksums: Tuple[Optional[str], ...], completed: bool,
+                           evaluated_checksums: Optional[MappedInputsChecksums] = None) -> None:
         """
         Stores the provided results in the recipe and caches them to disk if applicable
 
@@ -163,10 +164,18 @@ class ForeachRecipe(Recipe[R]):
         :param mapped_inputs_checksum: The checksum of all mapped inputs
         :param other_input_checksums: The checksums of other (non-mapped) inputs
         :param completed: Bool indicating whether all mapped inputs have been processed
+        :param evaluated_checksums: The already computed checksums of the evaluated inputs - if not provided, these will
+                                    be computed from the evaluated inputs
         """
-        self.mapped_inputs = evaluated
+        if evaluated_checksums is None:
+            self.mapped_inputs = evaluated
+        else:
+            self._mapped_inputs = evaluated
+            self._mapped_inputs_type = type(evaluated)
+            self._mapped_inputs_checksums = evaluated_checksums
         self._mapped_outputs = outputs
-        self._mapped_outputs_checksum = checksums.checksum(outputs)
+        # Each output already carries its own checksum, so combine those instead of checksumming all output values again
+        self._mapped_outputs_checksum = checksums.checksum(self.mapped_outputs_checksums)
         self._last_function_hash = self.function_hash
         if completed:
             self._mapped_inputs_checksum = mapped_inputs_checksum
@@ -176,7 +185,7 @@ class ForeachRecipe(Recipe[R]):
         self._input_checksums = (self._mapped_inputs_checksum,) + other_input_checksums
         self._save_state()
 
-    def to_dict(self) -> OrderedDict:
+    def to_dict(self) -> Dict[str, Any]:
         """
         :return: The ForeachRecipe as a dict for serialization purposes
         """
@@ -184,29 +193,15 @@ class ForeachRecipe(Recipe[R]):
         serialized_mapped_outputs: Optional[Union[Dict, List]] = None
         if self._mapped_outputs is not None:
             if isinstance(self._mapped_outputs, list):
-                outputs_list: List[CachedOutput] = []
-                for output in self._mapped_outputs:
-                    if isinstance(output, CachedOutput):
-                        outputs_list.append(output)
-                    elif isinstance(output, OutputWithValue):
-                        outputs_list.append(serialization.cache(output, self.cache_path))
-                    else:
-                        raise RuntimeError("Output is of wrong type")
+                outputs_list = [self._cache_output(output) for output in self._mapped_outputs]
                 serialized_mapped_outputs = [output.serialized for output in outputs_list]
                 self._mapped_outputs = cast(List[Output], outputs_list)
             elif isinstance(self._mapped_outputs, dict):
-                outputs_dict: Dict[Any, CachedOutput] = {}
-                for key, output in self._mapped_outputs.items():
-                    if isinstance(output, CachedOutput):
-                        outputs_dict[key] = output
-                    elif isinstance(output, OutputWithValue):
-                        outputs_dict[key] = serialization.cache(output, self.cache_path)
-                    else:
-                        raise RuntimeError("Output is of wrong type")
+                outputs_dict = {key: self._cache_output(output) for key, output in self._mapped_outputs.items()}
                 serialized_mapped_outputs = {key: output.serialized for key, output in outputs_dict.items()}
                 self._mapped_outputs = cast(Dict[Any, Output], outputs_dict)
 
-        return OrderedDict(
+        return dict(
             name=self.name,
             input_checksums=self.input_checksums,
             mapped_outputs=serialized_mapped_outputs,
@@ -225,7 +220,7 @@ class ForeachRecipe(Recipe[R]):
 
         :param old_state: The old cached state to restore
         """
-        log.debug("Restoring {} from dict".format(self._name))
+        log.debug("Restoring %s from dict", self._name)
         if old_state["input_checksums"] is not None:
             self._input_checksums = tuple(old_state["input_checksums"])
         mapped_type = old_state["mapped_type"]
@@ -236,9 +231,9 @@ class ForeachRecipe(Recipe[R]):
                                     zip(old_state["mapped_outputs"], old_state["mapped_outputs_checksums"])]
         elif mapped_type == "dict":
             self._mapped_inputs_type = dict
-            self._mapped_outputs = {key: CachedOutput(None, checksum, serialized)
-                                    for (key, serialized), checksum in
-                                    zip(old_state["mapped_outputs"].items(), old_state["mapped_outputs_checksums"])}
+            mapped_outputs_checksums = old_state["mapped_outputs_checksums"]
+            self._mapped_outputs = {key: CachedOutput(None, mapped_outputs_checksums[key], serialized)
+                                    for key, serialized in old_state["mapped_outputs"].items()}
         else:
             raise ValueError("Unknown mapped type: {}".format(mapped_type))
         self._last_function_hash = cast(str, old_state["last_function_hash"])
@@ -2,18 +2,39 @@ import argparse
 import logging
 import sys
 import traceback
-from typing import Dict, Union, Any, List, Optional
-from typing import Iterable, TextIO
+from typing import Dict, Union, Any, List, Optional, Set, Tuple
+from typing import Iterable, TextIO, TYPE_CHECKING
 
-from rich import console
-from rich.control import Control
+import networkx as nx
 
-from .core import Status, compute_recipe_status, create_graph
+from . import core
+from .core import Status, compute_graph_status, create_graph
 from .logging import log
 from .recipe import Recipe
 from .recipes import Arg
 from .types import ProgressType
 
+if TYPE_CHECKING:
+    from rich.console import Console
+
+
+# The top-level parser, the parser for the "brew" command and the recipe parsers that user args haven't been added to
+_Parsers = Tuple[argparse.ArgumentParser, argparse.ArgumentParser, Dict[str, argparse.ArgumentParser]]
+
+# The choices for the type of progress indication to use when brewing
+_PROGRESS_CHOICES = list(ProgressType)
+
+# The colors used to print each status
+_STATUS_COLORS: Dict[Status, str] = {
+    Status.Ok: "green",
+    Status.NotEvaluatedYet: "red",
+    Status.CustomDirty: "yellow",
+    Status.BoundFunctionChanged: "yellow",
+    Status.IngredientDirty: "yellow",
+    Status.InputsChanged: "yellow",
+    Status.OutputsInvalid: "yellow",
+}
+
 
 class Lab:
     """
@@ -21,6 +42,8 @@ class Lab:
 
     This can be used to create files that bear resemblance to Makefiles (see alkymi/labfile.py as an example)
     """
+    __slots__ = ("_name", "_recipes", "_args", "_console", "_graphs", "_full_graph", "_recipes_by_name", "_recipe_set",
+                 "_parsers", "_arg_parser_kwargs")
 
     def __init__(self, name: str):
         """
@@ -30,8 +53,14 @@ class Lab:
         """
         self._name = name
         self._recipes: List[Recipe] = []
+        self._recipes_by_name: Dict[str, Recipe] = {}
+        self._recipe_set: Set[Recipe] = set()  # Mirrors '_recipes' for fast membership checks
+        self._parsers: Optional[_Parsers] = None
         self._args: Dict[str, Arg] = {}
-        self._console = console.Console(stderr=False)  # Default to using stdout for output
+        self._arg_parser_kwargs: Dict[str, Dict[str, Any]] = {}
+        self._console: Optional["Console"] = None  # Created on first use to avoid importing rich unless needed
+        self._graphs: Dict[Recipe, nx.DiGraph] = {}
+        self._full_graph: Optional[nx.DiGraph] = None
 
     def add_recipe(self, recipe: Recipe) -> Recipe:
         """
@@ -40,8 +69,12 @@ class Lab:
         :param recipe: The recipe to add
         :return: The input recipe (to allow chaining calls)
         """
-        if recipe not in self._recipes:
+        if recipe not in self._recipe_set:
+            self._recipe_set.add(recipe)
             self._recipes.append(recipe)
+            self._recipes_by_name.setdefault(recipe.name, recipe)  # The first recipe added with a given name wins
+            self._full_graph = None
+            self._parsers = None
         return recipe
 
     def add_recipes(self, *recipes: Recipe) -> None:
@@ -60,6 +93,14 @@ class Lab:
         :param arg: The argument to register
         """
         self._args[arg.name] = arg
+        self._parsers = None
+
+        # For iterables (e.g. lists), the "type" keyword is actually the type of elements in the iterable
+        if issubclass(arg.type, Iterable) and not arg.type == str:
+            subtype = arg.subtype if arg.subtype is not None else str
+            self._arg_parser_kwargs[arg.name] = dict(type=subtype, nargs="*", dest=arg.name, help=arg.doc)
+        else:
+            self._arg_parser_kwargs[arg.name] = dict(type=arg.type, dest=arg.name, help=arg.doc)
 
     def brew(self, target_recipe: Union[Recipe, str], *, jobs=1,
              progress_type: Optional[ProgressType] = ProgressType.Fancy) -> Any:
@@ -76,11 +117,13 @@ class Lab:
         # Helper function to call brew on the matched recipe with CTRL-C handling
         def _call_brew(_recipe: Recipe) -> Any:
             try:
-                return _recipe.brew(jobs=jobs, progress_type=progress_type)
+                # Reuse the graph cached by this Lab - statuses are always recomputed, since args may have changed
+                return core.brew(_recipe, jobs=jobs, progress_type=progress_type, graph=self._graph_for(_recipe))
             except KeyboardInterrupt:
                 # Signal that execution was interrupted by the user and return cursor to normal state
-                self._console.print("\n[bold red]Interrupted by user")
-                self._console.control(Control.show_cursor(True))
+                from rich.control import Control
+                self._get_console().print("\n[bold red]Interrupted by user")
+                self._get_console().control(Control.show_cursor(True))
                 sys.exit(1)
             except Exception as e:  # noqa: Catch-all to fix traceback
                 # Omit the '_call_brew' stack frame, this exception handler stack frame and the
@@ -90,15 +133,15 @@ class Lab:
 
         if isinstance(target_recipe, str):
             # Try to match name
-            for recipe in self._recipes:
-                if recipe.name == target_recipe:
-                    return _call_brew(recipe)
-            raise ValueError("Unknown recipe: {}".format(target_recipe))
+            recipe = self._recipes_by_name.get(target_recipe)
+            if recipe is not None:
+                return _call_brew(recipe)
+            raise ValueError(f"Unknown recipe: {target_recipe}")
         else:
             # Match recipe directly
-            if target_recipe in self._recipes:
+            if target_recipe in self._recipe_set:
                 return _call_brew(target_recipe)
-            raise ValueError("Unknown recipe: {}".format(target_recipe.name))
+            raise ValueError(f"Unknown recipe: {target_recipe.name}")
 
     @property
     def name(self) -> str:
@@ -125,13 +168,37 @@ class Lab:
         """
         Compute statuses for all recipes (and dependent recipes) in this Lab
 
-        :return: The statuses as a dictionary
+        :return: The statuses as a dictionary, ordered such that recipes always come after their dependencies
         """
-        status: Dict[Recipe, Status] = {}
-        for recipe in self._recipes:
+        # Combine the graphs of all recipes, such that dependencies shared between recipes are only visited once
+        if self._full_graph is None:
+            self._full_graph = nx.DiGraph()
+            if len(self._recipes) > 0:
+                self._full_graph = nx.compose_all([self._graph_for(recipe) for recipe in self._recipes])
+        return compute_graph_status(self._full_graph)
+
+    def _graph_for(self, recipe: Recipe) -> nx.DiGraph:
+        """
+        Get the graph for a recipe, creating it on first use. The ingredients of a recipe are fixed when it is created,
+        so the graph never needs to be rebuilt
+
+        :param recipe: The recipe to get the graph for
+        :return: The graph representing the recipe and all its dependencies
+        """
+        graph = self._graphs.get(recipe)
+        if graph is None:
             graph = create_graph(recipe)
-            status.update(compute_recipe_status(recipe, graph))
-        return status
+            self._graphs[recipe] = graph
+        return graph
+
+    def _get_console(self) -> "Console":
+        """
+        :return: The console used for output, created on first use (defaults to using stdout for output)
+        """
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console(stderr=False)
+        return self._console
 
     def _add_user_args_(self, parser: argparse.ArgumentParser, args: Dict[str, Arg]) -> None:
         """
@@ -140,13 +207,8 @@ class Lab:
         :param parser: The parser to add the user-provided arguments to
         :param args: The arguments to add
         """
-        for arg_name, arg in args.items():
-            # For iterables (e.g. lists), the "type" keyword is actually the type of elements in the iterable
-            if issubclass(arg.type, Iterable) and not arg.type == str:
-                subtype = arg.subtype if arg.subtype is not None else str
-                parser.add_argument("--{}".format(arg_name), type=subtype, nargs="*", dest=arg_name, help=arg.doc)
-            else:
-                parser.add_argument("--{}".format(arg_name), type=arg.type, dest=arg_name, help=arg.doc)
+        for arg_name in args:
+            parser.add_argument(f"--{arg_name}", **self._arg_parser_kwargs[arg_name])
 
     @staticmethod
     def _remove_alkymi_internals_from_traceback(e: Exception, num_stack_frames_to_omit: int) -> str:
@@ -192,47 +254,26 @@ class Lab:
         :return: A string representation of this Lab with recipes and their statuses
         """
         status = self._build_full_status()
-        state = ''
-        for recipe in self._recipes:
-            state += '\n\t{} - {}'.format(recipe.name, status[recipe])
-        return '{} lab with recipes:{}'.format(self.name, state)
+        state = ''.join(f'\n\t{recipe.name} - {recipe_status}' for recipe, recipe_status in status.items()
+                        if recipe in self._recipe_set)
+        return f'{self.name} lab with recipes:{state}'
 
     def print_status(self) -> None:
-        colors = {
-            Status.Ok: "green",
-            Status.NotEvaluatedYet: "red",
-            Status.CustomDirty: "yellow",
-            Status.BoundFunctionChanged: "yellow",
-            Status.IngredientDirty: "yellow",
-            Status.InputsChanged: "yellow",
-            Status.OutputsInvalid: "yellow",
-        }
-
         status = self._build_full_status()
-        state = ''
-        for recipe in self._recipes:
-            color = colors[status[recipe]]
-            status_string = status[recipe].name.replace("Status.", "")
-            state += '\n\t[cyan]{} - [{}]{}'.format(recipe.name, color, status_string)
-        self._console.print('[bold]{} lab with recipes:[/bold]{}'.format(self.name, state))
+        state = ''.join(f'\n\t[cyan]{recipe.name} - [{_STATUS_COLORS[recipe_status]}]{recipe_status.name}'
+                        for recipe, recipe_status in status.items() if recipe in self._recipe_set)
+        self._get_console().print(f'[bold]{self.name} lab with recipes:[/bold]{state}')
 
-    def open(self, args: Optional[List[str]] = None, stream: TextIO = sys.stdout) -> None:
+    def _create_parsers(self) -> _Parsers:
         """
-        Runs the command line interface for this Lab by parsing command line arguments and carrying out the designated
-        command
+        Creates the parsers for the command line interface of this Lab. User args are not added to the parsers of the
+        individual recipes, since finding the args that affect a recipe requires traversing its graph - instead, the
+        recipe parsers are returned so that args can be added on demand (see '_add_recipe_args')
 
-        :param args: The input arguments to use - will default to system args
-        :param stream: The stream to print output to
+        :return: The top-level parser, the parser for the "brew" command and the parsers for recipes by name
         """
-        if len(self.recipes) == 0:
-            raise RuntimeError("No recipes added to lab - CLI is useless")
-
-        # Use system args if nothing has been provided
-        if args is None:
-            args = sys.argv[1:]
-
         # Create the top-level parser
-        parser = argparse.ArgumentParser('CLI for {}'.format(self._name))
+        parser = argparse.ArgumentParser(f'CLI for {self._name}')
         parser.add_argument("-v", "--verbose", action="store_true", help="Turn on verbose logging")
 
         subparsers = parser.add_subparsers(dest='subparser_name', metavar="")
@@ -247,20 +288,65 @@ class Lab:
         brew_parser.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
                                  help="Use N jobs to evaluate the recipe, more than 1 job will parallelize evaluation")
         brew_parser.add_argument("--progress", type=ProgressType, default=ProgressType.Fancy,
-                                 choices=list(ProgressType), help="The type of progress indication to use")
+                                 choices=_PROGRESS_CHOICES, help="The type of progress indication to use")
         brew_subparsers = brew_parser.add_subparsers(metavar="")
 
         # Create a parser (command) for each recipe that can be brewed
+        recipe_parsers: Dict[str, argparse.ArgumentParser] = {}
         for recipe in self._recipes:
             recipe_parser = brew_subparsers.add_parser(recipe.name, help=recipe.doc, description=recipe.doc,
                                                        formatter_class=argparse.MetavarTypeHelpFormatter)
             recipe_parser.set_defaults(recipe=recipe.name)
+            if self._args:
+                recipe_parsers[recipe.name] = recipe_parser
+
+        return parser, brew_parser, recipe_parsers
+
+    def _add_recipe_args(self, args: List[str], brew_parser: argparse.ArgumentParser,
+                         recipe_parsers: Dict[str, argparse.ArgumentParser]) -> None:
+        """
+        Adds the user-provided arguments that affect the recipe being brewed (if any) to the parser for that recipe
 
+        :param args: The input arguments that will be parsed
+        :param brew_parser: The parser for the "brew" command
+        :param recipe_parsers: The parsers for recipes that user args haven't been added to yet - the parser that args
+                               are added to will be removed
+        """
+        if "brew" not in args or not recipe_parsers:
+            return
+
+        # Let the brew parser find the name of the recipe, such that brew-specific options (and their values) are
+        # handled exactly as when parsing all arguments. Help is left out, since it would exit before args are added
+        brew_args = [arg for arg in args[args.index("brew") + 1:] if arg not in ("-h", "--help")]
+        recipe_name: Optional[str] = getattr(brew_parser.parse_known_args(brew_args)[0], "recipe", None)
+        recipe_parser = recipe_parsers.pop(recipe_name, None) if recipe_name is not None else None
+        if recipe_name is not None and recipe_parser is not None:
             # Use graph to only expose args that are connected to this recipe
-            graph = create_graph(recipe)
+            graph = self._graph_for(self._recipes_by_name[recipe_name])
             applicable_args = {arg_name: arg for arg_name, arg in self._args.items() if arg in graph}
             self._add_user_args_(recipe_parser, applicable_args)
 
+    def open(self, args: Optional[List[str]] = None, stream: TextIO = sys.stdout) -> None:
+        """
+        Runs the command line interface for this Lab by parsing command line arguments and carrying out the designated
+        command
+
+        :param args: The input arguments to use - will default to system args
+        :param stream: The stream to print output to
+        """
+        if len(self.recipes) == 0:
+            raise RuntimeError("No recipes added to lab - CLI is useless")
+
+        # Use system args if nothing has been provided
+        if args is None:
+            args = sys.argv[1:]
+
+        # Reuse the parsers from previous calls unless recipes or args have been added since
+        if self._parsers is None:
+            self._parsers = self._create_parsers()
+        parser, brew_parser, recipe_parsers = self._parsers
+        self._add_recipe_args(args, brew_parser, recipe_parsers)
+
         parsed_args = parser.parse_args(args)
         log.addHandler(logging.StreamHandler(stream))
         if parsed_args.verbose:
@@ -269,8 +355,9 @@ class Lab:
             log.setLevel(logging.INFO)
 
         # Create a new console object if output needs to go elsewhere
-        if self._console.file != stream:
-            self._console = console.Console(file=stream)
+        if self._get_console().file != stream:
+            from rich.console import Console
+            self._console = Console(file=stream)
 
         # Set arguments if supplied
         for arg_name, arg in self._args.items():
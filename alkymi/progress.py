@@ -24,7 +24,7 @@ class FancyProgress(rich.progress.Progress):
         :param console: An optional console object to use for output
         """
         self._console = rich.console.Console() if console is None else console
-        self._recipe_name = target_recipe.name
+        self._rule = Rule(title=f"Brewing {target_recipe.name}")
 
         # Define the columns to use for progress table
         super().__init__(TextColumn("[deep_sky_blue2]{task.description}"),
@@ -34,24 +34,23 @@ class FancyProgress(rich.progress.Progress):
                          TimeElapsedColumn(),
                          console=self._console, redirect_stdout=True, redirect_stderr=True)
 
-        # Build the progress table by adding all required tasks sorted topographically (target recipe at the bottom)
-        self._recipe_tasks: Dict[Recipe, TaskID] = {
-            recipe: self.add_task(recipe.name, start=False, total=1, completed=0)
-            for recipe in nx.topological_sort(graph)
-        }
-
-        # For all recipes that are already cached (Ok), mark them as completed from the beginning
-        for recipe, task_id in self._recipe_tasks.items():
+        # Build the progress table by adding all required tasks sorted topographically (target recipe at the bottom) -
+        # recipes that are already cached (Ok) are marked as completed from the beginning
+        self._recipe_tasks: Dict[Recipe, TaskID] = {}
+        for recipe in nx.topological_sort(graph):
             if statuses[recipe] == Status.Ok:
-                self.update(task_id, description=recipe.name + " [dim cyan](cached)[/dim cyan]", completed=1)
+                task_id = self.add_task(recipe.name + " [dim cyan](cached)[/dim cyan]", start=False, total=1,
+                                        completed=1)
                 self.stop_task(task_id)
+            else:
+                task_id = self.add_task(recipe.name, start=False, total=1, completed=0)
+            self._recipe_tasks[recipe] = task_id
 
     def get_renderables(self) -> Iterable[rich.console.RenderableType]:
         """
         Helper function used to render a horizontal rule with the target recipe name above the actual progress bars
         """
-        rule = Rule(title=f"Brewing {self._recipe_name}")
-        yield Group(rule, self.make_tasks_table(self.tasks))
+        yield Group(self._rule, self.make_tasks_table(self.tasks))
 
     def __call__(self, evaluate_progress: EvaluateProgress, recipe: Recipe, units_total: int, units_done: int) -> None:
         """
@@ -1,7 +1,10 @@
 import json
-from collections import OrderedDict
+import os
+import tempfile
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, Callable, List, Optional, Tuple, TypeVar, Generic, cast
+from types import CodeType
+from typing import Iterable, Callable, Optional, Tuple, TypeVar, Generic, Dict, Any, cast
 
 from . import checksums, serialization
 from .config import CacheType, AlkymiConfig
@@ -13,6 +16,24 @@ R = TypeVar("R")  # The return type of the bound function
 
 CleanlinessFunc = Callable[[R], bool]
 
+# The permissions to give cache files - temporary files are created with owner-only permissions, so these are applied
+# explicitly to give cache files the same permissions as regular files (according to the umask of the process)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+_CACHE_FILE_MODE = 0o666 & ~_UMASK
+
+
+@lru_cache(maxsize=None)
+def _module_name(filename: str) -> str:
+    """
+    Computes the name of the directory containing a source file - used to group the caches of recipes per module. The
+    result is cached, since many recipes are usually defined in the same file
+
+    :param filename: The name of the source file (e.g. from the code object of a function)
+    :return: The name of the directory containing the source file
+    """
+    return Path(filename).absolute().parent.stem
+
 
 class Recipe(Generic[R]):
     """
@@ -21,6 +42,9 @@ class Recipe(Generic[R]):
     automatically cached to disk to allow for checking of cleanliness (whether a Recipe is up-to-date), and to avoid
     invoking the bound function if necessary on subsequent evaluations
     """
+    __slots__ = ("_func", "_ingredients", "_name", "_transient", "_doc", "_cleanliness_func", "_cache", "_outputs",
+                 "_input_checksums", "_last_function_hash", "_function_hash_cache", "_last_saved_state", "cache_path",
+                 "cache_file")
 
     CACHE_DIRECTORY_NAME = ".alkymi_cache"
 
@@ -39,38 +63,46 @@ class Recipe(Generic[R]):
         :param cleanliness_func: A function to allow a custom cleanliness check
         """
         self._func = func
-        self._ingredients = list(ingredients)
+        self._ingredients = tuple(ingredients)
         self._name = name
         self._transient = transient
         self._doc = doc
         self._cleanliness_func = cleanliness_func
 
         # Set cache type based on default value (in AlkymiConfig)
+        config = AlkymiConfig.get()
         if cache == CacheType.Auto:
             # Pick based on what is in the config
-            self._cache = CacheType.Cache if AlkymiConfig.get().cache else CacheType.NoCache
+            self._cache = CacheType.Cache if config.cache else CacheType.NoCache
         else:
             self._cache = cache
 
         self._outputs: Optional[Output[R]] = None
         self._input_checksums: Optional[Tuple[Optional[str], ...]] = None
         self._last_function_hash: Optional[str] = None
+        self._function_hash_cache: Optional[Tuple[CodeType, str]] = None
+        self._last_saved_state: Optional[Dict[str, Any]] = None
 
-        if self.cache == CacheType.Cache:
+        if self._cache == CacheType.Cache:
             # Try to reload last state
-            func_file = Path(self._func.__code__.co_filename)
-            module_name = func_file.absolute().parent.stem
+            module_name = _module_name(self._func.__code__.co_filename)
 
             # Use the cache path set in the alkymi config, or fall back to current working dir
-            cache_root = AlkymiConfig.get().cache_path
+            cache_root = config.cache_path
             if cache_root is None:
                 cache_root = Path(".")
             self.cache_path = (cache_root / Recipe.CACHE_DIRECTORY_NAME / module_name / name).absolute()
 
             self.cache_file = self.cache_path / 'cache.json'
-            if self.cache_file.exists():
+            try:
+                # Open the cache file directly instead of checking for its existence first to save a file system call
                 with self.cache_file.open('r') as f:
-                    self.restore_from_dict(json.load(f))
+                    old_state = json.load(f)
+            except FileNotFoundError:
+                old_state = None
+            if old_state is not None:
+                self.restore_from_dict(old_state)
+                self._last_saved_state = self.to_dict()
 
     def __call__(self, *args) -> R:
         """
@@ -125,8 +157,28 @@ class Recipe(Generic[R]):
         """
         if self._cache == CacheType.Cache:
             self.cache_path.mkdir(exist_ok=True, parents=True)
-            with self.cache_file.open('w') as f:
-                f.write(json.dumps(self.to_dict(), indent=4))
+
+            # Skip rewriting the cache file if the state is unchanged since it was last loaded or saved
+            state = self.to_dict()
+            if state == self._last_saved_state and self.cache_file.exists():
+                return
+
+            # Encode the whole document in one go without indentation - this allows the json module to use its C
+            # encoder, whereas json.dump() and indented output always fall back to the much slower Python encoder
+            encoded_state = json.dumps(state, check_circular=False)
+
+            # Write to a uniquely named temporary file and atomically replace the previous state with it, such that
+            # neither an interrupted write nor another process saving the same recipe can leave a corrupt cache file
+            fd, tmp_cache_file = tempfile.mkstemp(dir=str(self.cache_path), prefix=self.cache_file.name, suffix=".tmp")
+            try:
+                os.chmod(tmp_cache_file, _CACHE_FILE_MODE)
+                with os.fdopen(fd, 'w') as f:
+                    f.write(encoded_state)
+                os.replace(tmp_cache_file, str(self.cache_file))
+            except BaseException:
+                os.unlink(tmp_cache_file)
+                raise
+            self._last_saved_state = state
 
     @property
     def outputs_valid(self) -> bool:
@@ -156,7 +208,7 @@ class Recipe(Generic[R]):
         return self._name
 
     @property
-    def ingredients(self) -> List['Recipe']:
+    def ingredients(self) -> Tuple['Recipe', ...]:
         """
         :return: The dependencies of this Recipe - the outputs of these Recipes will be provided as arguments to the
                  bound function when called (following the item from the mapped_inputs sequence)
@@ -189,7 +241,16 @@ class Recipe(Generic[R]):
         """
         :return: The hash of the bound function as a string
         """
-        return checksums.function_hash(self._func)
+        # The hash of a function without closures or default arguments only depends on its code object, which is
+        # immutable - in that case the hash can be computed once and reused for as long as the code object is unchanged
+        code = getattr(self._func, "__code__", None)
+        if self._function_hash_cache is not None and self._function_hash_cache[0] is code:
+            return self._function_hash_cache[1]
+        function_hash = checksums.function_hash(self._func)
+        if code is not None and getattr(self._func, "__closure__", None) is None and \
+                getattr(self._func, "__defaults__", None) is None:
+            self._function_hash_cache = (code, function_hash)
+        return function_hash
 
     @property
     def input_checksums(self) -> Optional[Tuple[Optional[str], ...]]:
@@ -225,22 +286,18 @@ class Recipe(Generic[R]):
             return None
         return self._outputs.checksum
 
-    def to_dict(self) -> OrderedDict:
+    def to_dict(self) -> Dict[str, Any]:
         """
         :return: The Recipe as a dict for serialization purposes
         """
         # Force caching of all outputs (if they aren't already)
         serialized_outputs = None
         if self._outputs is not None:
-            if isinstance(self._outputs, CachedOutput):
-                pass
-            elif isinstance(self._outputs, OutputWithValue):
-                self._outputs = serialization.cache(self._outputs, self.cache_path)
-            else:
-                raise RuntimeError("Output is of wrong type")
-            serialized_outputs = self._outputs.serialized
-
-        return OrderedDict(
+            cached_outputs = self._cache_output(self._outputs)
+            self._outputs = cached_outputs
+            serialized_outputs = cached_outputs.serialized
+
+        return dict(
             name=self.name,
             input_checksums=self.input_checksums,
             outputs=serialized_outputs,
@@ -248,13 +305,26 @@ class Recipe(Generic[R]):
             last_function_hash=self._last_function_hash,
         )
 
+    def _cache_output(self, output: Output) -> CachedOutput:
+        """
+        Cache an output of this Recipe to the cache path (if it isn't already cached)
+
+        :param output: The output to cache
+        :return: The cached output
+        """
+        if isinstance(output, CachedOutput):
+            return output
+        elif isinstance(output, OutputWithValue):
+            return serialization.cache(output, self.cache_path)
+        raise RuntimeError("Output is of wrong type")
+
     def restore_from_dict(self, old_state) -> None:
         """
         Restores the state of this Recipe from a previously cached state
 
         :param old_state: The old cached state to restore
         """
-        log.debug("Restoring {} from dict".format(self._name))
+        log.debug("Restoring %s from dict", self._name)
         self._input_checksums = tuple(old_state["input_checksums"])
         self._outputs = CachedOutput(None, old_state["output_checksum"], old_state["outputs"])
         self._last_function_hash = cast(str, old_state["last_function_hash"])
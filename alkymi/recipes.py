@@ -121,6 +121,7 @@ class Arg(Recipe[T]):
     recipe to downstream recipes. To change the input arguments, call ``set()`` again - this will mark the recipe as
     dirty and cause reevaluation of downstream recipe(s)
     """
+    __slots__ = ("_arg", "_type", "_subtype")
 
     def __init__(self, arg: T, name: str, doc: str, cache=CacheType.Auto):
         """
@@ -113,7 +113,7 @@ def serialize_item(item: Any, cache_path_generator: CachePathGenerator) -> Seria
     elif isinstance(item, Path):
         # External path - store the checksum of the file at the current point in time
         file_checksum = checksums.checksum(item)
-        return "{}{}:{}".format(PATH_TOKEN, file_checksum, item)
+        return f"{PATH_TOKEN}{file_checksum}:{item}"
     elif itype in (str, float, int, bool):
         return item
     elif isinstance(item, bytes):
@@ -160,8 +160,7 @@ def deserialize_item(item: SerializableRepresentation) -> Any:
         else:
             if item.startswith(PATH_TOKEN):
                 # Path encoded as string with checksum, e.g. "!#path#!CHECKSUM_HERE:/what/a/path"
-                non_token_part = item[len(PATH_TOKEN):]
-                _, path_str = non_token_part.split(":", maxsplit=1)
+                _, _, path_str = item[len(PATH_TOKEN):].partition(":")
                 return Path(path_str)
             elif item.startswith(BYTES_TOKEN):
                 # Bytes dumped to file
@@ -182,7 +181,7 @@ def deserialize_item(item: SerializableRepresentation) -> Any:
                     raise RuntimeError("No deserializer found for token: {}".format(found_token))
     elif isinstance(item, float) or isinstance(item, int):
         return item
-    elif isinstance(item, Sequence):
+    elif isinstance(item, list):
         return list(deserialize_item(subitem) for subitem in item)
     elif isinstance(item, dict):
         # These should never be triggered, because we always store keys and values as lists in serialize_item(), but
@@ -200,22 +199,29 @@ def deserialize_item(item: SerializableRepresentation) -> Any:
 
 def is_valid_serialized(item: SerializableRepresentation) -> bool:
     """
-    Recursively check validity of a serialized representation. Currently just looks for external files represented by
-    Path objects, and then compares the stored checksum of each such item with the current checksum (computed from the
-    current file contents)
+    Check validity of a (possibly nested) serialized representation. Currently just looks for external files represented
+    by Path objects, and then compares the stored checksum of each such item with the current checksum (computed from
+    the current file contents)
 
     :param item: The serialized representation to check validity for
     :return: True if the input is still valid
     """
-    if isinstance(item, str):
-        if item.startswith(PATH_TOKEN):
-            # Path encoded as string with checksum, e.g. "!#path#!CHECKSUM_HERE:/what/a/path"
-            non_token_part = item[len(PATH_TOKEN):]
-            stored_checksum, path_str = non_token_part.split(":", maxsplit=1)
-            current_checksum = checksums.checksum(Path(path_str))
-            return stored_checksum == current_checksum
-    elif isinstance(item, Sequence):
-        return all(is_valid_serialized(subitem) for subitem in item)
+    # Walk the nested structure using an explicit stack (in order), returning as soon as an invalid item is found
+    stack = [item]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            if item.startswith(PATH_TOKEN):
+                # Path encoded as string with checksum, e.g. "!#path#!CHECKSUM_HERE:/what/a/path"
+                stored_checksum, _, path_str = item[len(PATH_TOKEN):].partition(":")
+                if stored_checksum != checksums.checksum(Path(path_str)):
+                    return False
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+        elif isinstance(item, dict):
+            # Dictionaries are always stored as lists of keys and values by serialize_item()
+            stack.append(item["values"])
+            stack.append(item["keys"])
 
     # Other types are always valid
     return True
@@ -228,6 +234,7 @@ class Output(Generic[T], metaclass=ABCMeta):
     """
     Abstract base class for keeping track of outputs of Recipes
     """
+    __slots__ = ("_checksum",)
 
     def __init__(self, checksum: str):
         """
@@ -263,6 +270,7 @@ class OutputWithValue(Output[T]):
     """
     An Output that is guaranteed to have an in-memory value - all outputs start out as this before being cached
     """
+    __slots__ = ("_value",)
 
     def __init__(self, value: T, checksum: str):
         """
@@ -289,6 +297,7 @@ class CachedOutput(Output[T]):
     """
     An Output that has been cached - may or may not have it's associated value in-memory
     """
+    __slots__ = ("_value", "_serializable_representation")
 
     def __init__(self, value: Optional[T], checksum: str, serializable_representation: SerializableRepresentation):
         """
@@ -1,9 +1,14 @@
 #!/usr/bin/env python
 import logging
+import os
+import stat
 from pathlib import Path
 from typing import List
 
+import pytest
+
 from alkymi import AlkymiConfig
+from alkymi.config import CacheType
 import alkymi as alk
 from alkymi.core import Status
 from alkymi.recipe import Recipe
@@ -29,6 +34,17 @@ def test_caching(caplog, tmpdir):
     assert should_cache_recipe.status() == Status.Ok
     assert (tmpdir / Recipe.CACHE_DIRECTORY_NAME / "tests" / "should_cache").is_dir()
 
+    # The cache file should have been written (atomically) without leaving any temporary files behind
+    cache_dir = tmpdir / Recipe.CACHE_DIRECTORY_NAME / "tests" / "should_cache"
+    assert (cache_dir / "cache.json").is_file()
+    assert not any(f.suffix == ".tmp" for f in cache_dir.iterdir())
+
+    # The cache file should get the same permissions as any other file created by the process
+    umask = os.umask(0)
+    os.umask(umask)
+    if os.name == "posix":
+        assert stat.S_IMODE((cache_dir / "cache.json").stat().st_mode) == 0o666 & ~umask
+
     # Create a "copy" to force reloading from cache
     should_cache_recipe_copy = alk.recipe()(should_cache)
     assert should_cache_recipe_copy.status() == Status.Ok
@@ -133,3 +149,56 @@ def test_foreach_caching(caplog, tmpdir):
     record_execution_recipe_copy_2.brew()
     assert execution_counts == [1, 1, 1, 1, 1]
     assert record_execution_recipe_copy_2.status() == Status.Ok
+
+
+def test_unchanged_state_not_rewritten(tmpdir):
+    """
+    Test that reevaluating a recipe that produces the exact same state doesn't rewrite the cache file
+    """
+    tmpdir = Path(str(tmpdir))
+    AlkymiConfig.get().cache = True
+    AlkymiConfig.get().cache_path = tmpdir  # Use temporary directory for caching
+
+    def always_dirty() -> int:
+        return 42
+
+    # A custom cleanliness function that always fails will force reevaluation on every brew
+    always_dirty_recipe = Recipe(always_dirty, [], "always_dirty", transient=False, doc="", cache=CacheType.Auto,
+                                 cleanliness_func=lambda _: False)
+    always_dirty_recipe.brew()
+    cache_file = tmpdir / Recipe.CACHE_DIRECTORY_NAME / "tests" / "always_dirty" / "cache.json"
+    inode_before = cache_file.stat().st_ino
+
+    # The cache file is replaced atomically when written, so an unchanged inode means that it wasn't rewritten
+    assert always_dirty_recipe.status() == Status.CustomDirty
+    always_dirty_recipe.brew()
+    assert cache_file.stat().st_ino == inode_before
+
+    # Deleting the cache file should cause it to be written again
+    cache_file.unlink()
+    always_dirty_recipe.brew()
+    assert cache_file.exists()
+
+
+def test_failed_save_leaves_no_temporary_file(tmpdir, monkeypatch):
+    """
+    Test that a failure while replacing the cache file doesn't leave the temporary cache file behind
+    """
+    tmpdir = Path(str(tmpdir))
+    AlkymiConfig.get().cache = True
+    AlkymiConfig.get().cache_path = tmpdir  # Use temporary directory for caching
+
+    def failing_replace(src, dst):
+        raise OSError("Simulated failure")
+
+    def fails_to_save() -> int:
+        return 42
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    fails_to_save_recipe = Recipe(fails_to_save, [], "fails_to_save", transient=False, doc="", cache=CacheType.Auto)
+    with pytest.raises(OSError):
+        fails_to_save_recipe.brew()
+
+    cache_dir = tmpdir / Recipe.CACHE_DIRECTORY_NAME / "tests" / "fails_to_save"
+    assert not any(f.suffix == ".tmp" for f in cache_dir.iterdir())
+    assert not (cache_dir / "cache.json").exists()
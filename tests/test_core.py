@@ -227,6 +227,24 @@ def test_recipe_result_forwarding():
     assert result[1] == 42
 
 
+def test_brew_up_to_date(capsys: pytest.CaptureFixture) -> None:
+    """
+    Test that brewing an up-to-date recipe returns the cached result without showing any progress output
+    """
+    AlkymiConfig.get().cache = False
+
+    @alk.recipe()
+    def the_answer() -> int:
+        return 42
+
+    assert the_answer.brew(progress_type=ProgressType.Fancy) == 42
+    assert "Brewing the_answer" in capsys.readouterr().out
+
+    # The second brew should be a no-op
+    assert the_answer.brew(progress_type=ProgressType.Fancy) == 42
+    assert capsys.readouterr().out == ""
+
+
 # We use these globals to avoid altering the hashes of bound functions when any of these change
 execution_counts: Dict[str, int] = {}
 build_dir_global = Path()
@@ -13,6 +13,7 @@ execution_counts: Dict[Union[Path, str], int] = {}
 f1 = Path()
 f2 = Path()
 f3 = Path()
+evaluated_values: List[int] = []
 
 
 def test_execution(caplog, tmpdir):
@@ -151,6 +152,74 @@ def test_lists(caplog):
     _check_counts((2, 2, 1, 1, 1))
 
 
+execution_counts_dict: Dict[str, int] = {}
+
+
+def test_dicts(caplog):
+    """
+    Test using a dictionary (with keys that differ from the values) as the input to a foreach recipe
+    """
+    caplog.set_level(logging.DEBUG)
+    AlkymiConfig.get().cache = False
+
+    global execution_counts_dict
+    execution_counts_dict = {"a": 0, "b": 0}
+    arg = alkymi.recipes.arg({"a": 1, "b": 2}, name="args")
+
+    @alk.foreach(arg)
+    def record_execution(value: int) -> int:
+        execution_counts_dict["a" if value % 2 == 1 else "b"] += 1
+        return value * 2
+
+    # Initial brew should evaluate both items
+    assert record_execution.brew() == {"a": 2, "b": 4}
+    assert execution_counts_dict == {"a": 1, "b": 1}
+
+    # Changing a single value should only cause reevaluation of that item
+    arg.set({"a": 1, "b": 4})
+    assert record_execution.brew() == {"a": 2, "b": 8}
+    assert execution_counts_dict == {"a": 1, "b": 2}
+
+
+def test_dicts_cached(caplog, tmpdir):
+    """
+    Test that cached results of a foreach recipe using a dictionary as input are reused after reloading from the cache
+    """
+    tmpdir = Path(str(tmpdir))
+    caplog.set_level(logging.DEBUG)
+    AlkymiConfig.get().cache = True
+    AlkymiConfig.get().cache_path = tmpdir  # Use temporary directory for caching
+
+    global evaluated_values
+    evaluated_values = []
+
+    def record_execution(value: int) -> int:
+        evaluated_values.append(value)
+        return value * 2
+
+    # Initial brew should evaluate both items
+    arg = alkymi.recipes.arg({"a": 1, "b": 2}, name="args")
+    assert alk.foreach(arg)(record_execution).brew() == {"a": 2, "b": 4}
+    assert evaluated_values == [1, 2]
+
+    # Changing a single value should only cause reevaluation of that item, also when reloading from the cache
+    arg = alkymi.recipes.arg({"a": 1, "b": 3}, name="args")
+    recipe = alk.foreach(arg)(record_execution)
+    assert recipe.brew() == {"a": 2, "b": 6}
+    assert evaluated_values == [1, 2, 3]
+    output_checksum = recipe.output_checksum
+    assert recipe.mapped_outputs_checksums == {"a": alkymi.checksums.checksum(2), "b": alkymi.checksums.checksum(6)}
+
+    # Reloading from the cache should restore the same checksums without any reevaluation
+    recipe_copy = alk.foreach(arg)(record_execution)
+    assert recipe_copy.status() == Status.Ok
+    assert recipe_copy.output_checksum == output_checksum
+    assert recipe_copy.mapped_outputs_checksums == recipe.mapped_outputs_checksums
+    assert recipe_copy.brew() == {"a": 2, "b": 6}
+    assert recipe_copy.output_checksum == output_checksum
+    assert evaluated_values == [1, 2, 3]
+
+
 def test_bound_function_changed(caplog):
     """
     Test that changing the bound function of a ForeachRecipe causes a full re-evaluation
@@ -200,3 +269,56 @@ def test_invalid_foreach_outputs(caplog, tmpdir):
     assert files_with_values.status() == Status.OutputsInvalid
     files = files_with_values.brew()
     assert all([file.is_file() for file in files])
+
+
+def test_mapped_inputs_checksummed_once(caplog, monkeypatch):
+    """
+    Test that each mapped input is only checksummed once during evaluation of a ForeachRecipe
+    """
+    caplog.set_level(logging.DEBUG)
+    AlkymiConfig.get().cache = False
+
+    checksummed_items: List[str] = []
+    original_checksum = alkymi.checksums.checksum
+
+    def counting_checksum(obj):
+        if isinstance(obj, str) and obj.startswith("item"):
+            checksummed_items.append(obj)
+        return original_checksum(obj)
+
+    monkeypatch.setattr(alkymi.checksums, "checksum", counting_checksum)
+
+    items = alk.arg(["item{}".format(i) for i in range(10)], "items")
+
+    @alk.foreach(items)
+    def lengths(item: str) -> int:
+        return len(item)
+
+    assert lengths.brew() == [5] * 10
+    assert sorted(checksummed_items) == sorted(items.brew())
+    assert lengths.mapped_inputs_checksums == [original_checksum(item) for item in items.brew()]
+
+    # Changing a single item should only cause the items to be checksummed once more
+    checksummed_items.clear()
+    new_items = items.brew()[:-1] + ["itemNEW"]
+    items.set(new_items)
+    assert lengths.brew() == [5] * 9 + [7]
+    assert sorted(checksummed_items) == sorted(new_items)
+    assert lengths.mapped_inputs_checksums == [original_checksum(item) for item in new_items]
+
+    # The same applies to mapped inputs provided as a dictionary
+    dict_items = alk.arg({"item{}".format(i): "item{}".format(i) for i in range(10)}, "dict_items")
+
+    @alk.foreach(dict_items)
+    def dict_lengths(item: str) -> int:
+        return len(item)
+
+    checksummed_items.clear()
+    assert dict_lengths.brew() == {key: 5 for key in dict_items.brew()}
+    assert sorted(checksummed_items) == sorted(dict_items.brew().values())
+
+    checksummed_items.clear()
+    new_dict_items = dict(dict_items.brew(), item9="itemNEW")
+    dict_items.set(new_dict_items)
+    assert dict_lengths.brew() == dict({key: 5 for key in new_dict_items}, item9=7)
+    assert sorted(checksummed_items) == sorted(new_dict_items.values())
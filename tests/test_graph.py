@@ -5,10 +5,13 @@ import time
 from pathlib import Path
 from typing import List, Tuple
 
+import networkx as nx
 import pytest
 
 import alkymi as alk
 from alkymi import AlkymiConfig
+from alkymi.config import CacheType
+from alkymi.recipe import Recipe
 
 
 def test_create_graph() -> None:
@@ -72,6 +75,70 @@ def test_create_graph() -> None:
     assert graph.has_successor(c, root)
 
 
+def test_compute_status_shared_ingredient() -> None:
+    """
+    Test that the status of an ingredient shared by multiple recipes (diamond-shaped graph) is only computed once when
+    computing the status of the graph
+    """
+    AlkymiConfig.get().cache = False
+
+    num_cleanliness_checks = 0
+
+    def _check_clean(last_outputs: str) -> bool:
+        nonlocal num_cleanliness_checks
+        num_cleanliness_checks += 1
+        return True
+
+    def _shared() -> str:
+        return "shared"
+
+    shared = Recipe(_shared, [], "shared", transient=False, doc="", cache=CacheType.Auto,
+                    cleanliness_func=_check_clean)
+
+    @alk.recipe(ingredients=[shared])
+    def left(shared: str) -> str:
+        return shared + "_left"
+
+    @alk.recipe(ingredients=[shared])
+    def right(shared: str) -> str:
+        return shared + "_right"
+
+    @alk.recipe()
+    def top(left: str, right: str) -> str:
+        return left + right
+
+    top.brew()
+    num_cleanliness_checks = 0
+
+    statuses = alk.core.compute_recipe_status(top, alk.core.create_graph(top))
+    assert all(status == alk.Status.Ok for status in statuses.values())
+    assert num_cleanliness_checks == 1
+
+
+def test_compute_graph_status() -> None:
+    """
+    Test that the statuses of all recipes in a graph combined from multiple recipes can be computed in a single pass
+    """
+    AlkymiConfig.get().cache = False
+
+    @alk.recipe()
+    def shared() -> str:
+        return "shared"
+
+    @alk.recipe()
+    def first(shared: str) -> str:
+        return shared + "_first"
+
+    @alk.recipe()
+    def second(shared: str) -> str:
+        return shared + "_second"
+
+    first.brew()
+    full_graph = nx.compose(alk.core.create_graph(first), alk.core.create_graph(second))
+    statuses = alk.core.compute_graph_status(full_graph)
+    assert statuses == {shared: alk.Status.Ok, first: alk.Status.Ok, second: alk.Status.NotEvaluatedYet}
+
+
 def test_sequential() -> None:
     """
     Test that recipes can execute sequentially (without parallelism)
@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import os
 import shutil
 import time
 from pathlib import Path
@@ -6,7 +7,8 @@ from pathlib import Path
 import pytest
 
 from alkymi import checksums
-from alkymi.config import FileChecksumMethod, AlkymiConfig
+from alkymi.config import CacheType, FileChecksumMethod, AlkymiConfig
+from alkymi.recipe import Recipe
 
 
 def test_function_hash():
@@ -127,3 +129,137 @@ def test_path_checksum(tmpdir, file_checksum_method: FileChecksumMethod):
     shutil.rmtree(str(tmpdir))
     tmpdir_checksum_non_existent = checksums.checksum(tmpdir)
     assert tmpdir_checksum != tmpdir_checksum_non_existent
+
+
+def test_path_checksum_unmodified_file(tmpdir):
+    """
+    Test that the checksum of a file that was last modified a while ago is updated when the file is modified again
+    """
+    tmpdir = Path(str(tmpdir))
+    AlkymiConfig.get().file_checksum_method = FileChecksumMethod.HashContents
+
+    # Write file and pretend that it was last modified an hour ago
+    test_file = tmpdir / "test_file.txt"
+    test_file.write_text("Testing 0")
+    an_hour_ago = time.time() - 3600
+    os.utime(str(test_file), (an_hour_ago, an_hour_ago))
+    test_file_checksum_1 = checksums.checksum(test_file)
+    assert checksums.checksum(test_file) == test_file_checksum_1
+
+    # Modifying the file (keeping the same size) should change the checksum
+    test_file.write_text("Testing 1")
+    os.utime(str(test_file), (an_hour_ago + 1, an_hour_ago + 1))
+    test_file_checksum_2 = checksums.checksum(test_file)
+    assert test_file_checksum_2 != test_file_checksum_1
+
+    # Writing the original contents back should restore the original checksum
+    test_file.write_text("Testing 0")
+    assert checksums.checksum(test_file) == test_file_checksum_1
+
+
+def test_path_checksum_restored_mtime(tmpdir):
+    """
+    Test that rewriting a file with the same size and restoring its previous modification timestamp (as done by e.g.
+    'cp -p' or 'rsync -t') still changes the checksum
+    """
+    tmpdir = Path(str(tmpdir))
+    AlkymiConfig.get().file_checksum_method = FileChecksumMethod.HashContents
+
+    test_file = tmpdir / "test_file.txt"
+    test_file.write_text("AAAA")
+    an_hour_ago = time.time() - 3600
+    os.utime(str(test_file), (an_hour_ago, an_hour_ago))
+    test_file_checksum = checksums.checksum(test_file)
+
+    test_file.write_text("BBBB")
+    os.utime(str(test_file), (an_hour_ago, an_hour_ago))
+    assert checksums.checksum(test_file) != test_file_checksum
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Requires symlink support")
+def test_path_checksum_symlink_loop(tmpdir):
+    """
+    Test that a symlink loop is checksummed like a non-existent path (matching Path.exists()) instead of raising
+    """
+    tmpdir = Path(str(tmpdir))
+    loop = tmpdir / "loop"
+    loop.symlink_to(loop)
+    assert not loop.exists()
+    loop_checksum = checksums.checksum(loop)
+
+    loop.unlink()
+    assert checksums.checksum(loop) == loop_checksum
+
+
+def test_large_file_checksum(tmpdir):
+    """
+    Test that the contents of files larger than the read chunk size are hashed correctly
+    """
+    tmpdir = Path(str(tmpdir))
+    AlkymiConfig.get().file_checksum_method = FileChecksumMethod.HashContents
+
+    contents = os.urandom(3 * 1024 * 1024)
+    large_file = tmpdir / "large_file.bin"
+    large_file.write_bytes(contents)
+
+    hasher = checksums.Checksummer()
+    hasher.update(large_file)
+    large_file_checksum = hasher.digest()
+
+    # Changing the very last byte must change the checksum
+    large_file.write_bytes(contents[:-1] + bytes([(contents[-1] + 1) % 256]))
+    hasher = checksums.Checksummer()
+    hasher.update(large_file)
+    assert hasher.digest() != large_file_checksum
+
+    # Writing the original contents back should restore the original checksum
+    large_file.write_bytes(contents)
+    hasher = checksums.Checksummer()
+    hasher.update(large_file)
+    assert hasher.digest() == large_file_checksum
+
+
+def test_primitive_sequence_checksum():
+    """
+    Test that sequences of primitives, which are checksummed in bulk, don't collide with similar sequences
+    """
+    assert checksums.checksum(["ab"]) != checksums.checksum(["a", "b"])
+    assert checksums.checksum([256]) != checksums.checksum([0, 1])
+    assert checksums.checksum([1]) != checksums.checksum([True])
+    assert checksums.checksum([1]) != checksums.checksum([1.0])
+    assert checksums.checksum([1, 2]) != checksums.checksum((1, 2))
+    assert checksums.checksum([1, 2 ** 70]) != checksums.checksum([1, 2 ** 70 + 1])
+    assert checksums.checksum([1, 2, 3]) == checksums.checksum(list(range(1, 4)))
+
+
+def test_ndarray_checksum():
+    """
+    Test that numpy arrays can be checksummed, including non-contiguous views of arrays
+    """
+    np = pytest.importorskip("numpy")
+    array = np.arange(20).reshape(4, 5)
+    strided_view = array[:, ::2]
+    assert not strided_view.flags["C_CONTIGUOUS"]
+    assert checksums.checksum(strided_view) == checksums.checksum(strided_view.copy())
+    assert checksums.checksum(strided_view) != checksums.checksum(array[:, 1::2])
+
+
+def test_recipe_function_hash_reused():
+    """
+    Test that the function hash of a Recipe is reused, but still picks up changes to the bound function
+    """
+    def func() -> int:
+        return 1
+
+    def other_func() -> int:
+        return 2
+
+    recipe = Recipe(func, [], "func", transient=False, doc="", cache=CacheType.NoCache)
+    func_hash = recipe.function_hash
+    assert func_hash == checksums.function_hash(func)
+    assert recipe.function_hash == func_hash
+
+    # Replacing the code object of the function must result in a new hash
+    func.__code__ = other_func.__code__
+    assert recipe.function_hash == checksums.function_hash(other_func)
+    assert recipe.function_hash != func_hash
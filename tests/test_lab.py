@@ -134,6 +134,71 @@ def test_lab_arg(arg_name: str) -> None:
     assert arg.brew() == new_value
 
 
+def test_lab_arg_repeated_open() -> None:
+    """
+    Test that args are only exposed for the recipes they affect when a lab's command line interface is used repeatedly
+    """
+    AlkymiConfig.get().cache = False
+
+    value = alk.arg(2, name="value")
+    outputs: List[int] = []
+
+    @alk.recipe()
+    def doubled(value: int) -> int:
+        outputs.append(value * 2)
+        return value * 2
+
+    @alk.recipe()
+    def unrelated() -> int:
+        return 0
+
+    lab = alk.Lab("repeated lab")
+    lab.add_recipes(doubled, unrelated)
+    lab.register_arg(value)
+
+    lab.open(["brew", "-j", "1", doubled.name, "--value=3"])
+    lab.open(["brew", unrelated.name])
+    lab.open(["brew", doubled.name, "--value=4"])
+    assert outputs == [6, 8]
+
+    # The arg doesn't affect 'unrelated', so it shouldn't be accepted
+    with pytest.raises(SystemExit):
+        lab.open(["brew", unrelated.name, "--value=5"])
+
+
+def test_lab_arg_brew_option_values() -> None:
+    """
+    Test that values of brew-specific options aren't mistaken for the name of the recipe to brew, even if they match the
+    name of another recipe
+    """
+    AlkymiConfig.get().cache = False
+
+    value = alk.arg(2, name="value")
+    outputs: List[int] = []
+
+    @alk.recipe()
+    def doubled(value: int) -> int:
+        outputs.append(value * 2)
+        return value * 2
+
+    @alk.recipe(name="none")
+    def named_like_progress_type() -> int:
+        return 0
+
+    @alk.recipe(name="2")
+    def named_like_number_of_jobs() -> int:
+        return 0
+
+    lab = alk.Lab("option values lab")
+    lab.add_recipes(doubled, named_like_progress_type, named_like_number_of_jobs)
+    lab.register_arg(value)
+
+    lab.open(["brew", "--progress", "none", doubled.name, "--value=3"])
+    lab.open(["brew", "-j", "2", doubled.name, "--value=4"])
+    lab.open(["brew", "--prog", "none", doubled.name, "--value=5"])
+    assert outputs == [6, 8, 10]
+
+
 def test_lab_arg_string_list() -> None:
     """
     Test providing a list of strings as an argument to a recipe through a lab's command line interface
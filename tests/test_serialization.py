@@ -183,6 +183,30 @@ def test_complex_serialization(tmpdir, file_checksum_method: FileChecksumMethod)
         assert not obj_cached.valid
 
 
+def test_dict_serialization_validity(tmpdir):
+    """
+    Test that Path objects nested inside a serialized dictionary are taken into account when checking for validity
+    """
+    AlkymiConfig.get().cache = True
+    AlkymiConfig.get().file_checksum_method = FileChecksumMethod.HashContents
+    tmpdir = Path(str(tmpdir))
+    AlkymiConfig.get().cache_path = tmpdir  # Use temporary directory for caching
+    subdir = tmpdir / "subdir"
+    subdir.mkdir()
+
+    file_a = tmpdir / "file_a.txt"
+    file_a.write_text(file_a.name)
+
+    value = {"a": file_a, "nested": {"list": [1, file_a]}}
+    obj = OutputWithValue(value, checksums.checksum(value))
+    obj_cached = serialization.cache(obj, subdir)
+    assert obj_cached.valid
+
+    # Changing the file referenced from within the dictionary should cause invalidation
+    file_a.write_text("Changed!")
+    assert not obj_cached.valid
+
+
 class MyClass:
     def __init__(self, value):
         self.value = value